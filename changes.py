@@ -22,8 +22,8 @@
 
 import argparse
 import collections
-import copy
 import enum
+import functools
 import logging
 import os
 import re
@@ -32,7 +32,6 @@ import sys
 import tempfile
 
 import jinja2
-import yaml
 
 import cli
 
@@ -43,6 +42,9 @@ TEMPLATES_DIRECTORY = os.path.join(CHANGES_DIRECTORY, "templates")
 MULTIPLE_RELEASE_TEMPLATE = "multiple.markdown"
 SINGLE_RELEASE_TEMPLATE = "single.markdown"
 
+CONVENTIONAL_COMMIT_PARSER = re.compile(r"^(.+?)(\((.+?)\))?(\!)?:(.+)$")
+SEMANTIC_VERSION_PARSER = re.compile(r"^((.+?)_)?(\d+)\.(\d+)\.(\d+)$", re.ASCII)
+
 
 class Type(enum.Enum):
     CI = "ci"
@@ -52,21 +54,15 @@ class Type(enum.Enum):
     UNKNOWN = "UNKNOWN"
 
 
+TYPES = {type.value: type for type in Type}
+
+
 class Sections(enum.Enum):
     IGNORE = "IGNORE"
     CHANGES = "CHANGES"
     FIXES = "FIXES"
 
 
-OPERATIONS = {
-    Type.CI: None,
-    Type.DOCUMENTATION: None,
-    Type.FEATURE: lambda commit, version: version.bump_minor(),
-    Type.FIX: lambda commit, version: version.bump_patch(),
-    Type.UNKNOWN: None,
-}
-
-
 TYPE_TO_SECTION = {
     Type.CI: Sections.IGNORE,
     Type.DOCUMENTATION: Sections.IGNORE,
@@ -96,8 +92,11 @@ class Chdir(object):
         os.chdir(self.pwd)
 
 
+@functools.total_ordering
 class Version(object):
 
+    __slots__ = ("major", "minor", "patch", "did_update_major", "did_update_minor", "did_update_patch")
+
     def __init__(self, major=0, minor=0, patch=0):
         self.major = major
         self.minor = minor
@@ -127,6 +126,10 @@ class Version(object):
         self.patch = self.patch + 1
         self.did_update_patch = True
 
+    def clone(self):
+        """Returns a new version with the same number, ready to be bumped independently."""
+        return Version(self.major, self.minor, self.patch)
+
     @property
     def initial_development(self):
         if self.major == 0:
@@ -136,45 +139,44 @@ class Version(object):
     def __str__(self):
         return f"{self.major}.{self.minor}.{self.patch}"
 
+    @property
+    def components(self):
+        return (self.major, self.minor, self.patch)
+
     def __eq__(self, other):
-        if self.major != other.major:
-            return False
-        if self.minor != other.minor:
-            return False
-        if self.patch != other.patch:
-            return False
-        return True
+        if self is other:
+            return True
+        return self.components == other.components
 
     def __lt__(self, other):
-        if self == other:
-            return False
-        if self.major > other.major:
-            return False
-        if self.major < other.major:
-            return True
-        if self.minor > other.minor:
-            return False
-        if self.minor < other.minor:
-            return True
-        if self.patch > other.patch:
-            return False
-        return True
+        return self.components < other.components
 
     def __hash__(self):
-        return str(self).__hash__()
+        return hash(self.components)
 
     @classmethod
     def from_string(self, string, strip_scope=None):
         return parse_version(string, scope=strip_scope)
 
 
+OPERATIONS = {
+    Type.CI: None,
+    Type.DOCUMENTATION: None,
+    Type.FEATURE: Version.bump_minor,
+    Type.FIX: Version.bump_patch,
+    Type.UNKNOWN: None,
+}
+
+
 class Change(object):
 
+    __slots__ = ("message",)
+
     def __init__(self, message):
         self.message = message
 
     def __eq__(self, other):
-        if type(self) != type(other):
+        if type(other) is not type(self):
             return False
         return self.message == other.message
 
@@ -184,6 +186,8 @@ class Change(object):
 
 class Commit(Change):
 
+    __slots__ = ("sha", "tags", "version")
+
     def __init__(self, sha, message, tags, version):
         super().__init__(message)
         self.sha = sha
@@ -193,14 +197,17 @@ class Commit(Change):
 
 class Message(object):
 
+    __slots__ = ("type", "scope", "breaking_change", "description", "bumps_version")
+
     def __init__(self, type, scope, breaking_change, description):
         self.type = type
         self.scope = scope
         self.breaking_change = breaking_change
         self.description = description
+        self.bumps_version = OPERATIONS[type] is not None
 
     def __eq__(self, other):
-        if type(self) != type(other):
+        if type(other) is not type(self):
             return False
         if self.type != other.type:
             return False
@@ -218,6 +225,8 @@ class Message(object):
 
 class Release(object):
 
+    __slots__ = ("version", "changes", "is_released")
+
     def __init__(self, version, changes, is_released=False):
         self.version = version
         self.changes = changes
@@ -225,22 +234,19 @@ class Release(object):
 
     def set_previous_version(self, previous_version):
         """Recomputes the current version based on the previous version by applying the changes in order."""
-        self.version = copy.deepcopy(previous_version)
+        self.version = previous_version.clone()
         for commit in reversed(self.changes):
-            if commit.message.type in OPERATIONS and OPERATIONS[commit.message.type] is not None:
+            if commit.message.bumps_version:
                 if commit.message.breaking_change:
                     self.version.bump_major()
                 else:
-                    OPERATIONS[commit.message.type](commit, self.version)
+                    OPERATIONS[commit.message.type](self.version)
             else:
                 logging.warning("Ignoring commit: '%s'", commit.message.description)
 
     @property
     def is_empty(self):
-        for change in self.changes:
-            if OPERATIONS[change.message.type] is not None:
-                return False
-        return True
+        return not any(change.message.bumps_version for change in self.changes)
 
     def merge(self, release):
         self.changes.extend(release.changes)
@@ -252,6 +258,8 @@ class Release(object):
 
 class Section(object):
 
+    __slots__ = ("type", "changes")
+
     def __init__(self, type, changes):
         self.type = type
         self.changes = changes
@@ -263,41 +271,57 @@ class Section(object):
 
 class History(object):
 
-    def __init__(self, path, scope=None, history=None, skip_unreleased=False):
+    def __init__(self, path, scope=None, history=None, skip_unreleased=False, head_only=False):
         self.path = os.path.abspath(path)
         self.scope = scope
         self.skip_unreleased = skip_unreleased
+        self.head_only = head_only
         self.history = os.path.abspath(history) if history is not None else None
         self._load()
 
     def _load(self):
         with Chdir(self.path):
 
-            if is_shallow():
+            shallow, head = get_head()
+            if shallow:
                 logging.error("Unable to determine change history for shallow clones.")
                 exit(1)
 
-            # Get all the changes on the current branch.
-            all_changes = get_commits(scope=self.scope)
-
-            # Group the changes by release.
-            releases = []
-            releases.append(Release(None, []))
+            # Guard against empty repositories.
+            if head is not None:
+                tags_by_sha = get_tags()
+                versions_by_sha = get_versions(tags_by_sha, scope=self.scope)
+                all_changes = get_commits(tags_by_sha, versions_by_sha)
+            else:
+                versions_by_sha = {}
+                all_changes = []
+
+            # If only the most recent release is required, we can stop reading the history once we've seen the
+            # release with the highest tagged version, as no older release can be sorted ahead of it. Tags that
+            # aren't reachable from HEAD simply mean we never stop early.
+            latest_version = max(versions_by_sha.values(), default=None) if self.head_only else None
+
+            # Group the changes by release, indexing the released versions as we go.
+            head_release = Release(None, [])
+            previous_version = None
+            releases_by_version = {}
+            release = head_release
             for change in all_changes:
                 if change.version is not None:
+                    if latest_version is not None and release.is_released and release.version == latest_version:
+                        break
                     release = Release(change.version, [], is_released=True)
-                    releases.append(release)
-                releases[-1].changes.append(change)
-
-            # Fix-up the version number for any un-released current release.
-            if releases[0].version is None:
-                releases[0].set_previous_version(releases[1].version if len(releases) > 1 else Version(0, 0, 0))
+                    releases_by_version[change.version] = release
+                    if previous_version is None:
+                        previous_version = change.version
+                release.changes.append(change)
 
-            # Remove the empty head release if there's already an active release.
-            if len(releases) > 1 and releases[0].is_empty:
-                releases.pop(0)
+            # Fix-up the version number for the un-released head release.
+            head_release.set_previous_version(previous_version if previous_version is not None else Version(0, 0, 0))
 
-            releases_by_version = {release.version: release for release in releases}
+            # Only include the head release if it has changes, or if there's no other release.
+            if not releases_by_version or not head_release.is_empty:
+                releases_by_version.setdefault(head_release.version, head_release)
 
             if self.history is not None:
                 for version, release in load_history(path=self.history, scope=self.scope).items():
@@ -306,19 +330,22 @@ class History(object):
                     except KeyError:
                         releases_by_version[version] = release
 
-            releases = list(sorted(releases_by_version.values(),
-                                   key=lambda release: release.version, reverse=True))
-
-            if self.skip_unreleased:
-                self.releases = [release for release in releases if release.is_released]
-            else:
-                self.releases = releases
+            self.releases = [release for release in sorted(releases_by_version.values(),
+                                                           key=lambda release: release.version, reverse=True)
+                             if release.is_released or not self.skip_unreleased]
 
 
 def load_history(path, scope=None):
+    # PyYAML is only needed when a history file is in use, so it's imported here to keep start-up fast.
+    import yaml
+    try:
+        from yaml import CSafeLoader as SafeLoader
+    except ImportError:
+        from yaml import SafeLoader
+
     history = {}
     with open(path) as fh:
-        contents = yaml.load(fh, Loader=yaml.SafeLoader)
+        contents = yaml.load(fh, Loader=SafeLoader)
     # Check the format.
     if not isinstance(contents, dict):
         raise ValueError("Invalid configuration")
@@ -327,9 +354,7 @@ def load_history(path, scope=None):
             version = Version.from_string(version_string, scope)
             if not isinstance(version_string, str) or not isinstance(changes, list):
                 raise ValueError("Invalid configuration")
-            messages = [parse_message(change) for change in changes]
-            commits = [Change(message=message) for message in messages]
-            commits.reverse()
+            commits = [Change(message=parse_message(change)) for change in reversed(changes)]
             release = Release(version, commits, is_released=True)
             history[version] = release
         except UnknownScope:
@@ -341,81 +366,128 @@ def run(command, dry_run=False):
     if dry_run:
         logging.info(command)
         return []
-    result = subprocess.run(command, capture_output=True)
-    result.check_returncode()
-    lines = result.stdout.decode("utf-8").strip().split("\n")
-    return lines
+    result = subprocess.run(command, capture_output=True, check=True, encoding="utf-8", errors="replace")
+    return result.stdout.splitlines()
+
+
+def run_stream(command):
+    """Runs a command, yielding each line of its output as it becomes available."""
+    # stderr goes to a temporary file rather than a pipe so a chatty command can't block on a full stderr pipe while
+    # we're waiting on stdout.
+    with tempfile.TemporaryFile("w+", encoding="utf-8", errors="replace") as stderr, \
+            subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr, encoding="utf-8", errors="replace") as process:
+        for line in process.stdout:
+            yield line.rstrip("\n")
+        if process.wait() != 0:
+            stderr.seek(0)
+            raise subprocess.CalledProcessError(process.returncode, command, stderr=stderr.read())
+
+
+def get_head():
+    """
+    Returns a tuple indicating whether the repository is a shallow clone, and the SHA of HEAD (or None if there are no
+    commits), using a single git invocation.
+    """
+    result = subprocess.run(["git", "rev-parse", "--is-shallow-repository", "--verify", "--quiet", "HEAD"],
+                            capture_output=True, encoding="utf-8", errors="replace")
+    # `--verify --quiet` exits with status 1 (and no SHA) when HEAD doesn't resolve to a commit.
+    if result.returncode not in (0, 1):
+        result.check_returncode()
+    lines = result.stdout.splitlines()
+    return lines[0] == "true", lines[1] if result.returncode == 0 else None
+
+
+def get_tags():
+    """Returns a dictionary mapping commit SHAs to the names of the tags that point to them."""
+    # `--dereference` follows each annotated tag with a `<tag>^{}` line giving the object it ultimately points to (peeling
+    # nested tags all the way), so letting those lines overwrite the tag's own entry keys every tag on its commit.
+    result = subprocess.run(["git", "show-ref", "--tags", "--dereference"],
+                            capture_output=True, encoding="utf-8", errors="replace")
+    # `show-ref` exits with status 1 (and no output) when there are no tags.
+    if result.returncode not in (0, 1):
+        result.check_returncode()
+    shas_by_tag = {}
+    for line in result.stdout.splitlines():
+        sha, ref = line.split(" ", 1)
+        tag = ref[len("refs/tags/"):]
+        if tag.endswith("^{}"):
+            tag = tag[:-len("^{}")]
+        shas_by_tag[tag] = sha
+    tags = collections.defaultdict(list)
+    for tag, sha in shas_by_tag.items():
+        tags[sha].append(tag)
+    return tags
 
 
-def is_shallow():
-    return run(["git", "rev-parse", "--is-shallow-repository"])[0] == "true"
+class UnknownScope(ValueError):
+    pass
 
-def get_tags(sha):
-    try:
-        return run(["git", "describe", "--tags", "--exact-match", sha])
-    except subprocess.CalledProcessError:
-        return []
 
+def match_version(tag, scope=None):
+    """Returns the version match for `tag` (or None if it isn't a version), and whether it's in `scope`."""
+    match = SEMANTIC_VERSION_PARSER.match(tag)
+    return match, match is not None and match.group(2) == scope
 
-class UnknownScope(ValueError):
-    pass
+
+def version_from_match(match):
+    return Version(major=int(match.group(3)),
+                   minor=int(match.group(4)),
+                   patch=int(match.group(5)))
 
 
 def parse_version(tag, scope=None):
-    sv_parser = re.compile(r"^((.+?)_)?(\d+).(\d+).(\d+)$")
-    match = sv_parser.match(tag)
-    if match:
-        tag_scope = match.group(2)
-        if tag_scope != scope:
-            raise UnknownScope("'%s' contains unknown scope." % tag)
-        return Version(major=int(match.group(3)),
-                       minor=int(match.group(4)),
-                       patch=int(match.group(5)))
-    raise ValueError("'%s' is not a valid version." % tag)
+    match, in_scope = match_version(tag, scope)
+    if match is None:
+        raise ValueError("'%s' is not a valid version." % tag)
+    if not in_scope:
+        raise UnknownScope("'%s' contains unknown scope." % tag)
+    return version_from_match(match)
 
 
 def version_from_tags(tags, scope=None):
+    """Returns the highest in-scope version in `tags`, or None if there isn't one."""
+    versions = []
     for tag in tags:
-        try:
-            return parse_version(tag, scope)
-        except ValueError:
-            pass
-    return None
+        # Check the tag up-front to avoid raising (and catching) exceptions for non-version and out-of-scope tags.
+        match, in_scope = match_version(tag, scope)
+        if in_scope:
+            versions.append(version_from_match(match))
+    return max(versions, default=None)
 
 
-def get_commits(scope=None):
-    # Guard against empty repositories.
-    count = int(run(["git", "rev-list", "--all", "--count"])[0])
-    if count < 1:
-        return []
+def get_versions(tags_by_sha, scope=None):
+    """Returns a dictionary mapping commit SHAs to the version of their tags, for commits with a version tag in scope."""
+    versions_by_sha = {}
+    for sha, tags in tags_by_sha.items():
+        version = version_from_tags(tags, scope)
+        if version is not None:
+            versions_by_sha[sha] = version
+    return versions_by_sha
+
 
-    results = []
+def get_commits(tags_by_sha, versions_by_sha):
+    """Yields the commits on the current branch, newest first, as they're read from git."""
     command = ["git", "log", "--pretty=format:%H:%s"]
     try:
-        commits = run(command)
+        for line in run_stream(command):
+            sha, _, message = line.partition(":")
+            yield Commit(sha, parse_message(message), tags_by_sha.get(sha, []), versions_by_sha.get(sha))
     except subprocess.CalledProcessError as e:
-        logging.error(e.stderr.decode("utf-8"))
+        logging.error(e.stderr)
         exit(1)
-    for c in commits:
-        sha, message = c.split(":", 1)
-        tags = get_tags(sha)
-        commit = Commit(sha, parse_message(message), tags, version_from_tags(tags, scope))
-        results.append(commit)
-    return results
 
 
 def parse_message(message):
-    cc_parser = re.compile(r"^(.+?)(\((.+?)\))?(\!)?:(.+)$")
-    match = cc_parser.match(message)
+    # Messages without a colon can't be Conventional Commits, so there's no need to run the regex.
+    match = CONVENTIONAL_COMMIT_PARSER.match(message) if ":" in message else None
     if match is not None:
         (cc_type, cc_scope, cc_break, cc_description) = (match.group(1), match.group(3), match.group(4), match.group(5))
-        try:
-            return Message(type=Type(cc_type),
+        message_type = TYPES.get(cc_type)
+        if message_type is not None:
+            return Message(type=message_type,
                            scope=cc_scope,
                            breaking_change=(cc_break == "!"),
                            description=cc_description.strip())
-        except ValueError:
-            pass
     return Message(type=Type.UNKNOWN,
                    scope=None,
                    breaking_change=False,
@@ -423,28 +495,41 @@ def parse_message(message):
 
 
 def group_changes(changes):
-    sections = {}
+    changes_section = Section(type=Sections.CHANGES, changes=[])
+    fixes_section = Section(type=Sections.FIXES, changes=[])
+    buckets = {
+        Sections.IGNORE: None,
+        Sections.CHANGES: changes_section.changes,
+        Sections.FIXES: fixes_section.changes,
+    }
     for commit in changes:
-        section_type = TYPE_TO_SECTION[commit.message.type]
-        if section_type not in sections:
-            sections[section_type] = Section(type=section_type, changes=[])
-        section = sections[section_type]
-        section.changes.append(commit.message)
-    results = []
-    if Sections.CHANGES in sections:
-        results.append(sections[Sections.CHANGES])
-    if Sections.FIXES in sections:
-        results.append(sections[Sections.FIXES])
-    return results
+        bucket = buckets[TYPE_TO_SECTION[commit.message.type]]
+        if bucket is not None:
+            bucket.append(commit.message)
+    return [section for section in (changes_section, fixes_section) if section.changes]
+
+
+class AbsolutePathLoader(jinja2.BaseLoader):
+
+    def get_source(self, environment, template):
+        path = os.path.abspath(template)
+        if not os.path.exists(path):
+            raise jinja2.TemplateNotFound(path)
+        mtime = os.path.getmtime(path)
+        with open(path) as f:
+            source = f.read()
+        return source, path, lambda: mtime == os.path.getmtime(path)
+
+
+# Shared across calls so that each template is only loaded and compiled once per process.
+ENVIRONMENT = jinja2.Environment(loader=jinja2.ChoiceLoader([
+    AbsolutePathLoader(),
+    jinja2.FileSystemLoader(TEMPLATES_DIRECTORY),
+]), auto_reload=False)
 
 
 def format_notes(releases, template):
-    loader = jinja2.ChoiceLoader([
-        AbsolutePathLoader(),
-        jinja2.FileSystemLoader(TEMPLATES_DIRECTORY),
-    ])
-    environment = jinja2.Environment(loader=loader)
-    return environment.get_template(template).render(releases=releases, Sections=Sections).rstrip() + "\n"
+    return ENVIRONMENT.get_template(template).render(releases=releases, Sections=Sections).rstrip() + "\n"
 
 
 def resolve_scope(options):
@@ -461,7 +546,7 @@ def resolve_scope(options):
     cli.Argument("--released", action="store_true", default=False, help="scope to be used in tags and commit messages"),
 ])
 def command_version(options):
-    history = History(path=os.getcwd(), scope=resolve_scope(options), skip_unreleased=options.released)
+    history = History(path=os.getcwd(), scope=resolve_scope(options), skip_unreleased=options.released, head_only=True)
     print(history.releases[0].version)
 
 
@@ -491,7 +576,7 @@ def command_release(options):
         exit(1)
 
     scope = resolve_scope(options)
-    history = History(path=os.getcwd(), scope=scope)
+    history = History(path=os.getcwd(), scope=scope, head_only=True)
     releases = history.releases
     if releases[0].is_released or releases[0].is_empty:
         # There aren't any unreleased versions.
@@ -525,11 +610,11 @@ def command_release(options):
             template = SINGLE_RELEASE_TEMPLATE
         notes = format_notes(releases=[releases[0]], template=template)
 
-        with tempfile.NamedTemporaryFile() as notes_file, tempfile.TemporaryDirectory() as temporary_directory:
+        with tempfile.NamedTemporaryFile("w") as notes_file, tempfile.TemporaryDirectory() as temporary_directory:
 
-            # Create a temporary directory containing the notes.
-            with open(notes_file.name, "w") as fh:
-                fh.write(notes)
+            # Write the notes to the temporary file, flushing to ensure they're visible to the command.
+            notes_file.write(notes)
+            notes_file.flush()
 
             # Create a temporary executable script to make it easy to forward arguments to the command.
             if options.command is not None:
@@ -542,7 +627,7 @@ def command_release(options):
                 command = os.path.abspath(options.exec)
 
             # Set up the environment.
-            env = copy.deepcopy(os.environ)
+            env = os.environ.copy()
             env['CHANGES_TITLE'] = title
             env['CHANGES_VERSION'] = str(version)
             env['CHANGES_INITIAL_DEVELOPMENT'] = "true" if version.initial_development else "false"
@@ -555,7 +640,8 @@ def command_release(options):
             if options.dry_run:
                 logging.info("Running command '%s'...", command_args)
             else:
-                logging.debug("Running command '%s' in directory '%s' with files '%s'...", command_args, os.getcwd(), os.listdir())
+                if logging.getLogger().isEnabledFor(logging.DEBUG):
+                    logging.debug("Running command '%s' in directory '%s' with files '%s'...", command_args, os.getcwd(), os.listdir())
                 result = subprocess.run(command_args, capture_output=True, env=env)
                 try:
                     result.check_returncode()
@@ -574,18 +660,6 @@ def command_release(options):
     logging.info("Done.")
 
 
-class AbsolutePathLoader(jinja2.BaseLoader):
-
-    def get_source(self, environment, template):
-        path = os.path.abspath(template)
-        if not os.path.exists(path):
-            raise jinja2.TemplateNotFound(path)
-        mtime = os.path.getmtime(path)
-        with open(path) as f:
-            source = f.read()
-        return source, path, lambda: mtime == os.path.getmtime(path)
-
-
 @cli.command("notes", help="output the release notes", arguments=[
     cli.Argument("--scope", help="filter the release notes to the given scope"),
     cli.Argument("--skip-unreleased", action="store_true", help="skip unreleased versions"),
@@ -598,7 +672,8 @@ def command_notes(options):
     history = History(path=os.getcwd(),
                       history=options.history,
                       scope=resolve_scope(options),
-                      skip_unreleased=options.released)
+                      skip_unreleased=options.released,
+                      head_only=not options.all)
 
     if options.template is not None:
         template = os.path.abspath(options.template)
@@ -626,13 +701,13 @@ You can find out more about Conventional Commits and Semantic Versioning at the
 """
 
 def main():
-    verbose = '--verbose' in sys.argv[1:] or '-v' in sys.argv[1:]
-    logging.basicConfig(level=logging.DEBUG if verbose else logging.INFO, format="[%(levelname)s] %(message)s")
     parser = cli.CommandParser(description=DESCRIPTION, epilog=EPILOG, formatter_class=argparse.RawDescriptionHelpFormatter)
     parser.add_argument('--verbose', '-v', action='store_true', default=False, help="show verbose output")
     if "--scope" in sys.argv:
         parser.add_argument("--scope", dest="legacy_scope", help="scope to be used in tags and commit messages")
-    parser.run()
+    options = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if options.verbose else logging.INFO, format="[%(levelname)s] %(message)s")
+    parser.run(options)
 
 
 if __name__ == "__main__":
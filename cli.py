@@ -72,8 +72,12 @@ class CommandParser(object):
     def add_argument(self, *args, **kwargs):
         self.parser.add_argument(*args, **kwargs)
 
-    def run(self):
-        options = self.parser.parse_args()
+    def parse_args(self):
+        return self.parser.parse_args()
+
+    def run(self, options=None):
+        if options is None:
+            options = self.parse_args()
         if 'fn' not in options:
             logging.error("No command specified.")
             exit(1)
@@ -27,6 +27,11 @@ import unittest
 
 import yaml
 
+try:
+    from yaml import CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeDumper
+
 TESTS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
 ROOT_DIRECTORY = os.path.dirname(TESTS_DIRECTORY)
 
@@ -114,7 +119,7 @@ class Repository(object):
         return self.write_file(path, "#!/bin/bash\n" + contents, 0o744)
 
     def write_yaml(self, path, contents):
-        return self.write_file(path, yaml.dump(contents))
+        return self.write_file(path, yaml.dump(contents, Dumper=SafeDumper))
 
     def git(self, arguments):
         return self.run(["git"] + arguments)
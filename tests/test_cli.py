@@ -64,6 +64,27 @@ class CLITestCase(unittest.TestCase):
             ])
             self.assertEqual(repository.changes(["version"]).strip(), "1.0.0")
 
+    def test_version_annotated_tag(self):
+        with Repository() as repository:
+            repository.perform([
+                EmptyCommit("inital commit"),
+            ])
+            repository.git(["tag", "-a", "0.2.0", "-m", "Release 0.2.0"])
+            self.assertEqual(repository.changes(["version"]).strip(), "0.2.0")
+            repository.perform([
+                EmptyCommit("fix: this fix should update the patch version"),
+            ])
+            self.assertEqual(repository.changes(["version"]).strip(), "0.2.1")
+
+    def test_version_nested_annotated_tag(self):
+        with Repository() as repository:
+            repository.perform([
+                EmptyCommit("inital commit"),
+            ])
+            repository.git(["tag", "-a", "release", "-m", "Release"])
+            repository.git(["tag", "-a", "1.0.0", "release", "-m", "Release 1.0.0"])
+            self.assertEqual(repository.changes(["version"]).strip(), "1.0.0")
+
     def test_version_no_changes(self):
         with Repository() as repository:
             self.assertEqual(repository.changes(["version"]).strip(), "0.0.0")
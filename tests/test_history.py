@@ -64,6 +64,57 @@ class HistoryTestCase(unittest.TestCase):
             self.assertEqual(history.releases[1].changes, [Change(Message(type=Type.FEATURE, scope=None, breaking_change=False, description="New feature"))])
             self.assertNotEqual(history.releases[1].changes, [Change(Message(type=Type.FIX, scope=None, breaking_change=False, description="New feature"))])
 
+    def test_head_only(self):
+        with Repository() as repository:
+            repository.perform([
+                EmptyCommit("initial commit"),
+                Tag("1.0.0"),
+                EmptyCommit("feat: Feature"),
+                Tag("1.1.0"),
+                EmptyCommit("fix: Fix"),
+                Tag("1.1.1"),
+                EmptyCommit("fix: Another fix"),
+            ])
+            history = History(path=repository.path)
+            head_history = History(path=repository.path, head_only=True)
+            self.assertEqual([str(release.version) for release in history.releases], ["1.1.2", "1.1.1", "1.1.0", "1.0.0"])
+            self.assertEqual([str(release.version) for release in head_history.releases], ["1.1.2", "1.1.1"])
+            self.assertEqual(head_history.releases[0].changes, history.releases[0].changes)
+            self.assertEqual(head_history.releases[1].changes, history.releases[1].changes)
+
+            released_history = History(path=repository.path, skip_unreleased=True, head_only=True)
+            self.assertEqual([str(release.version) for release in released_history.releases], ["1.1.1"])
+
+    def test_head_only_out_of_order_tags(self):
+        with Repository() as repository:
+            repository.perform([
+                EmptyCommit("initial commit"),
+                Tag("2.0.0"),
+                EmptyCommit("fix: Fix"),
+                Tag("1.0.0"),
+                EmptyCommit("fix: Another fix"),
+            ])
+            history = History(path=repository.path)
+            head_history = History(path=repository.path, head_only=True)
+            self.assertEqual(str(history.releases[0].version), "2.0.0")
+            self.assertEqual(str(head_history.releases[0].version), "2.0.0")
+            self.assertEqual(head_history.releases[0].changes, history.releases[0].changes)
+
+    def test_multiple_version_tags_uses_highest(self):
+        with Repository() as repository:
+            repository.perform([
+                EmptyCommit("initial commit"),
+                Tag("2.2.1"),
+                EmptyCommit("fix: Fix"),
+                Tag("2.1.1"),
+            ])
+            repository.git(["tag", "-a", "2.2.3", "-m", "Release 2.2.3"])
+            history = History(path=repository.path)
+            head_history = History(path=repository.path, head_only=True)
+            self.assertEqual(str(history.releases[0].version), "2.2.3")
+            self.assertEqual(str(head_history.releases[0].version), "2.2.3")
+            self.assertEqual(repository.changes(["version"]).strip(), "2.2.3")
+
     def test_invalid_configuraiton_fails(self):
         with Repository() as repository:
             repository.write_yaml("history.yaml", {
@@ -59,6 +59,16 @@ class VersionTestCase(unittest.TestCase):
         self.assertFalse(Version(1, 1, 2) < Version(1, 1, 1))
         self.assertTrue(Version(0, 1, 0) < Version(1, 0, 0))
 
+        # Derived comparisons.
+        self.assertTrue(Version(1, 0, 0) <= Version(1, 0, 0))
+        self.assertTrue(Version(1, 0, 1) > Version(1, 0, 0))
+        self.assertTrue(Version(2, 0, 0) >= Version(1, 9, 9))
+        self.assertFalse(Version(1, 0, 0) > Version(1, 0, 0))
+
+    def test_hash(self):
+        self.assertEqual(hash(Version(1, 10, 5)), hash(Version(1, 10, 5)))
+        self.assertEqual(len({Version(1, 2, 3), Version(1, 2, 3), Version(3, 2, 1)}), 2)
+
     def test_from_string(self):
         self.assertEqual(Version.from_string("1.5.7"), Version(1, 5, 7))
         self.assertEqual(Version.from_string("0.23.0"), Version(0, 23, 0))
@@ -69,6 +79,12 @@ class VersionTestCase(unittest.TestCase):
         with self.assertRaises(ValueError):
             Version.from_string("macOS_1.4.6"), Version(1, 4, 6)
 
+    def test_from_string_requires_separators(self):
+        with self.assertRaises(ValueError):
+            Version.from_string("1a5b7")
+        with self.assertRaises(ValueError):
+            Version.from_string("1.5")
+
     def test_from_string_unknown_scope(self):
         with self.assertRaises(changes.UnknownScope):
             Version.from_string("1.3.4", strip_scope="macOS")
@@ -92,6 +108,15 @@ class VersionTestCase(unittest.TestCase):
         self.assertNotEqual([str(version) for version in input_versions], output)
         self.assertEqual([str(version) for version in sorted(input_versions)], output)
 
+    def test_clone(self):
+        version = Version(1, 2, 3)
+        clone = version.clone()
+        self.assertEqual(clone, version)
+        self.assertIsNot(clone, version)
+        clone.bump_minor()
+        self.assertEqual(clone, Version(1, 3, 0))
+        self.assertEqual(version, Version(1, 2, 3))
+
     def test_initial_development(self):
         self.assertTrue(Version().initial_development)
         self.assertTrue(Version(0, 1, 4).initial_development)